@@ -1,95 +1,229 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
-import io
 import subprocess
 import numpy as np
 from PIL import Image
-from collections import defaultdict
+from collections import Counter, defaultdict
 import math
+import errno
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
 import zipfile
 import tempfile
 import shutil
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
+try:
+    # ISA-L deflate: same output format, 2-3x faster than zlib for the ZIP step
+    from isal import isal_zlib
+    zipfile.zlib = isal_zlib
+except ImportError:
+    pass
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend
 
 # Configuration
 BLACK_THRESHOLD = 120
 FINAL_SIZE = (3000, 3000)
-PPI = 300
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB per file
+MAX_FILES_PER_REQUEST = 50
+
+_ALLOWED_SUFFIXES = tuple('.' + ext for ext in ALLOWED_EXTENSIONS)
+
+# secure_filename() output is ASCII, so ASCII digits are all we need to strip
+_DIGIT_DEL = str.maketrans('', '', '0123456789')
+
+# Temp file kind prefix -> folder in the output ZIP
+ZIP_FOLDERS = {'svg': 'svg', 'eps': 'eps', 'grp': 'groups'}
+
+# Redefines potrace's color operators as DeviceCMYK (rgb -> cmy + black, gray -> black only).
+# Works whether or not potrace compresses the page body, since the lookup happens at run time.
+# Wrapped in its own save/restore so the overrides don't leak into a host document.
+CMYK_PROLOG = (
+    b"save\n"
+    b"/setrgbcolor { 3 copy max max dup 0 eq { pop pop pop pop 0 0 0 1 } "
+    b"{ 4 1 roll 3 { 3 index div 1 exch sub 3 1 roll } repeat 4 -1 roll 1 exch sub } ifelse "
+    b"setcmykcolor } bind def\n"
+    b"/setgray { 1 exch sub 0 0 0 4 -1 roll setcmykcolor } bind def\n"
+)
+CMYK_EPILOG = b"restore\n"
+
+# Shared /dev/null handles for potrace spawns
+_DEVNULL = open(os.devnull, 'wb')
+_DEVNULL_R = open(os.devnull, 'rb')
+
+_shm_reserved = 0
+_shm_lock = threading.Lock()
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# Let Werkzeug reject oversized uploads before they're buffered
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE * MAX_FILES_PER_REQUEST
 
-# 🔍 Ghostscript path detection
-def get_gs_command():
-    """Detect Ghostscript command based on OS"""
-    if os.name == "nt":
-        possible = [
-            r"C:\Program Files\gs\gs10.06.0\bin\gswin64c.exe",
-            r"C:\Program Files\gs\gs10.05.0\bin\gswin64c.exe",
-            r"C:\Program Files (x86)\gs\gs10.06.0\bin\gswin32c.exe",
-        ]
-        for path in possible:
-            if os.path.isfile(path):
-                return path
-        return "gswin64c"
-    return "gs"
-
-GS_CMD = get_gs_command()
+def reserve_temp_root():
+    """Pick scratch root, return (root, reserved_bytes)
+
+    RAM-backed /dev/shm is used only when its free space covers a full request on
+    top of the requests already using it in this process. Other server processes
+    aren't counted, so running out of space is still reported (see _raise_if_no_space).
+    """
+    global _shm_reserved
+    need = app.config['MAX_CONTENT_LENGTH']
+    with _shm_lock:
+        try:
+            if shutil.disk_usage('/dev/shm').free >= _shm_reserved + need:
+                _shm_reserved += need
+                return '/dev/shm', need
+        except OSError:
+            pass
+    return None, 0  # system default temp dir
+
+def release_temp_root(reserved):
+    """Give back space taken by reserve_temp_root()"""
+    global _shm_reserved
+    with _shm_lock:
+        _shm_reserved -= reserved
+
+def _raise_if_no_space(e):
+    """Fail the request on a full scratch disk instead of silently dropping the file"""
+    if isinstance(e, OSError) and e.errno == errno.ENOSPC:
+        raise e
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+def write_pbm(mask, pbm_path):
+    """Write boolean mask (True = black) as 1-bit binary PBM (P4)"""
+    h, w = mask.shape
+    packed = np.packbits(mask, axis=1)  # rows padded to byte boundaries
+    with open(pbm_path, 'wb') as f:
+        f.write(f"P4\n{w} {h}\n".encode())
+        f.write(packed.tobytes())
 
-def raster_to_pbm(image_bytes, pbm_path, threshold=BLACK_THRESHOLD):
-    """Convert raster image to black/white PBM"""
+def mask_to_tile(mask, size):
+    """Render mask as white uint8 tile of size (h, w), black where mask is True; clips or pads to fit"""
+    h, w = size
+    tile = np.where(mask[:h, :w], np.uint8(0), np.uint8(255))
+    if tile.shape != (h, w):
+        tile = np.pad(tile, ((0, h - tile.shape[0]), (0, w - tile.shape[1])), constant_values=255)
+    return tile
+
+def raster_to_pbm(image_file, pbm_path, threshold=BLACK_THRESHOLD):
+    """Convert raster image (path or file object) to black/white PBM, return (success, black mask)"""
     try:
-        img = Image.open(io.BytesIO(image_bytes)).convert("L")
+        img = Image.open(image_file)
+        if img.mode != "L":  # convert() copies even when the mode already matches
+            img = img.convert("L")
         data = np.array(img)
         mask = data < threshold
-        bw = Image.fromarray(np.where(mask, 0, 255).astype(np.uint8))
-        bw.save(pbm_path, format="PPM")
-        return True
+        write_pbm(mask, pbm_path)
+        return True, mask
     except Exception as e:
+        _raise_if_no_space(e)
         print(f"Error in raster_to_pbm: {e}")
-        return False
+        return False, None
+
+def center_scale_to_canvas(image: Image.Image, size=(3000, 3000), scale_factor=0.85,
+                           resample=Image.BILINEAR):
+    """Center and scale image to fixed canvas size
 
-def center_scale_to_canvas(image: Image.Image, size=(3000, 3000), scale_factor=0.85):
-    """Center and scale image to fixed canvas size"""
+    Input is binary and gets re-thresholded afterwards, so a cheap filter
+    gives the same result as LANCZOS.
+    """
     w, h = image.size
     target_w, target_h = size
     scale = min(target_w / w, target_h / h) * scale_factor
     new_w = int(w * scale)
     new_h = int(h * scale)
-    img_resized = image.resize((new_w, new_h), Image.LANCZOS)
+    img_resized = image.resize((new_w, new_h), resample)
     canvas = Image.new("L", size, 255)
     offset_x = (target_w - new_w) // 2
     offset_y = (target_h - new_h) // 2
     canvas.paste(img_resized, (offset_x, offset_y))
     return canvas
 
-def convert_to_cmyk_eps(input_eps, output_eps):
-    """Convert EPS to CMYK color space"""
+def trace_to_cmyk_eps(pbm_path, output_eps):
+    """Trace PBM to EPS with potrace and switch its colors to DeviceCMYK"""
     try:
-        subprocess.run([
-            GS_CMD,
-            "-dNOPAUSE", "-dBATCH", "-dSAFER",
-            "-sDEVICE=eps2write",
-            "-dUseCIEColor",
-            f"-r{PPI}",
-            "-dEPSCrop",
-            f"-sOutputFile={output_eps}",
-            input_eps
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        proc = subprocess.Popen(["potrace", "-e", "-o", "-", pbm_path], stdin=_DEVNULL_R,
+                                stdout=subprocess.PIPE, stderr=_DEVNULL)
+        with proc.stdout:
+            eps = proc.stdout.read()
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        
+        # potrace's own save/restore sits inside the compressed body, so wrap the
+        # page in ours: overrides after %%Page, restore before the trailer/EOF
+        for marker in (b"%%Page:", b"%%EndComments"):
+            start = eps.find(marker)
+            if start != -1:
+                start = eps.index(b"\n", start) + 1
+                break
+        else:
+            start = 0
+        for marker in (b"%%Trailer", b"%%EOF"):
+            end = eps.rfind(marker)
+            if end >= start:
+                break
+        else:
+            end = len(eps)
+        
+        with open(output_eps, 'wb') as f:
+            f.write(eps[:start])
+            f.write(CMYK_PROLOG)
+            f.write(eps[start:end])
+            if end and eps[end - 1:end] != b"\n":
+                f.write(b"\n")
+            f.write(CMYK_EPILOG)
+            f.write(eps[end:])
         return True
     except Exception as e:
-        print(f"Ghostscript error: {e}")
+        print(f"EPS conversion error: {e}")
+        # Don't leave a truncated EPS behind to be zipped
+        if os.path.exists(output_eps):
+            os.remove(output_eps)
+        _raise_if_no_space(e)
         return False
 
+class _ChunkSink:
+    """Write-only file object that collects bytes for a streaming response"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def iter_zip(entries):
+    """Yield ZIP archive bytes for (file_path, arcname) pairs, one file at a time"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+        for file_path, arcname in entries:
+            zip_file.write(file_path, arcname)
+            yield sink.drain()
+    yield sink.drain()
+
+@functools.lru_cache(maxsize=1)
 def check_dependencies():
-    """Check if required binaries are available"""
+    """Check if required binaries are available (probed once per process)"""
     deps = {}
     try:
         subprocess.run(["potrace", "--version"], 
@@ -98,18 +232,122 @@ def check_dependencies():
     except:
         deps['potrace'] = False
     
-    try:
-        subprocess.run([GS_CMD, "--version"], 
-                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        deps['ghostscript'] = True
-    except:
-        deps['ghostscript'] = False
-    
     return deps
 
+def _init_worker():
+    """Lower pool worker priority (inherited by potrace) so request threads stay responsive"""
+    # No per-core pinning: each server process has its own pool, so pinning by pool
+    # index would stack every pool onto the same first cores
+    if hasattr(os, 'nice'):
+        os.nice(5)
+
+def get_pool_size():
+    """Usable cores split across server processes (gunicorn reads WEB_CONCURRENCY too)"""
+    if hasattr(os, 'sched_getaffinity'):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    return max(1, cores // int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+def get_process_pool():
+    """Return the worker pool shared by all request threads, creating it on first use"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Forking a multi-threaded server process is unsafe; start workers from a clean process
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            ctx = multiprocessing.get_context(method)
+            _process_pool = ProcessPoolExecutor(max_workers=get_pool_size(), mp_context=ctx,
+                                                initializer=_init_worker)
+        return _process_pool
+
+def discard_process_pool(pool):
+    """Drop a broken pool so the next get_process_pool() call builds a fresh one"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _run_potrace(args):
+    """Run potrace with stdout discarded, return its exit status"""
+    proc = subprocess.Popen(["potrace", *args], stdin=_DEVNULL_R,
+                            stdout=_DEVNULL, stderr=subprocess.PIPE)
+    with proc.stderr:
+        err = proc.stderr.read()
+    if proc.wait() != 0 and os.strerror(errno.ENOSPC).encode() in err:
+        # Full scratch disk: fail the request instead of dropping the file
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+    return proc.returncode
+
+def _trace_batch(flag, pbm_paths, ext):
+    """Run potrace once over several PBMs, return {pbm_path: output_path} for successes"""
+    # Without -o, potrace writes each output next to its input with the suffix replaced
+    out_paths = [os.path.splitext(pbm_path)[0] + ext for pbm_path in pbm_paths]
+    ok = _run_potrace([flag, *pbm_paths]) == 0
+    if not ok:
+        # potrace creates each output before reading its input and stops at the first
+        # failure, so only outputs before the last one created are complete
+        created = [i for i, out_path in enumerate(out_paths) if os.path.exists(out_path)]
+        done = created[-1] if created else 0
+    
+    outputs = {}
+    for i, (pbm_path, out_path) in enumerate(zip(pbm_paths, out_paths)):
+        if not ok and i >= done:
+            # Retry the rest one at a time so only the bad input is lost
+            if len(pbm_paths) == 1 or _run_potrace([flag, pbm_path]) != 0:
+                if os.path.exists(out_path):
+                    os.remove(out_path)  # empty or truncated
+                print(f"potrace failed to produce {ext} for {pbm_path}")
+                continue
+        outputs[pbm_path] = out_path
+    return outputs
+
+def _process_batch(jobs, threshold, include_eps, work_dir):
+    """Convert a batch of images to PBM, SVG and (optionally) CMYK EPS"""
+    pbms = []
+    for input_path, filename, prefix, keep_mask in jobs:
+        base_name = os.path.splitext(filename)[0]
+        
+        # Convert to PBM
+        pbm_path = os.path.join(work_dir, f"bw__{base_name}.pbm")
+        ok, mask = raster_to_pbm(input_path, pbm_path, threshold)
+        if ok:
+            # Only masks that will be grouped go back to the parent, bit-packed (8x smaller)
+            packed = (np.packbits(mask, axis=1), mask.shape[1]) if keep_mask else None
+            pbms.append((filename, prefix, pbm_path, packed))
+    
+    if not pbms:
+        return []
+    
+    # Generate SVGs
+    results = []
+    svgs = _trace_batch("-s", [pbm[2] for pbm in pbms], ".svg")
+    for filename, prefix, pbm_path, mask in pbms:
+        if pbm_path in svgs:
+            base_name = os.path.splitext(filename)[0]
+            os.replace(svgs[pbm_path], os.path.join(work_dir, f"svg__{base_name}.svg"))
+            results.append((filename, prefix, pbm_path, mask))
+    
+    # Generate EPSs if requested
+    if include_eps and results:
+        for filename, _, pbm_path, _ in results:
+            base_name = os.path.splitext(filename)[0]
+            trace_to_cmyk_eps(pbm_path, os.path.join(work_dir, f"eps__{base_name}.eps"))
+    
+    return results
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Reject uploads over MAX_CONTENT_LENGTH"""
+    return jsonify({'error': 'Upload too large'}), 413
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    # ?refresh=1 re-probes binaries, e.g. after installing them
+    if request.args.get('refresh') == '1':
+        check_dependencies.cache_clear()
     deps = check_dependencies()
     return jsonify({
         'status': 'healthy',
@@ -137,67 +375,85 @@ def process_images():
     if not files or files[0].filename == '':
         return jsonify({'error': 'No files selected'}), 400
     
+    if len(files) > MAX_FILES_PER_REQUEST:
+        return jsonify({'error': f'Too many files (max {MAX_FILES_PER_REQUEST})'}), 400
+    
     # Get options
     threshold = int(request.form.get('threshold', BLACK_THRESHOLD))
     include_eps = request.form.get('include_eps', 'true').lower() == 'true'
     group_by_prefix = request.form.get('group_by_prefix', 'true').lower() == 'true'
     
-    # Create temporary working directory
-    temp_dir = tempfile.mkdtemp()
+    # Create temporary working directory (flat; files are named <kind>__<name>)
+    temp_root, reserved = reserve_temp_root()
+    try:
+        temp_dir = tempfile.mkdtemp(dir=temp_root)
+    except OSError as e:
+        release_temp_root(reserved)
+        return jsonify({'error': str(e)}), 500
+    
+    def cleanup():
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        release_temp_root(reserved)
     
     try:
-        input_dir = os.path.join(temp_dir, 'input')
-        temp_bw_dir = os.path.join(temp_dir, 'temp_bw')
-        output_svg_dir = os.path.join(temp_dir, 'output_svg')
-        output_eps_dir = os.path.join(temp_dir, 'output_eps')
-        output_group_dir = os.path.join(temp_dir, 'output_groups')
-        
-        for d in [input_dir, temp_bw_dir, output_svg_dir, output_eps_dir, output_group_dir]:
-            os.makedirs(d, exist_ok=True)
-        
         groups = defaultdict(list)
         processed_files = []
         
-        # Step 1: Process individual images
+        # Spool uploads into the scratch dir (file handles can't be sent to worker
+        # processes); workers decode straight from disk, the parent never holds the bytes
+        jobs = []
+        used_stems = set()
         for file in files:
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                base_name = os.path.splitext(filename)[0]
-                prefix = ''.join([c for c in base_name if not c.isdigit()]).rstrip("_-") or base_name
-                
-                # Read file
-                file_bytes = file.read()
-                if len(file_bytes) > MAX_FILE_SIZE:
-                    continue
-                
-                # Convert to PBM
-                pbm_path = os.path.join(temp_bw_dir, base_name + ".pbm")
-                if not raster_to_pbm(file_bytes, pbm_path, threshold):
-                    continue
-                
-                # Generate SVG
-                svg_path = os.path.join(output_svg_dir, base_name + ".svg")
-                try:
-                    subprocess.run(["potrace", "-s", "-o", svg_path, pbm_path],
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                except:
+                # Check size without reading the upload
+                file.stream.seek(0, os.SEEK_END)
+                size = file.stream.tell()
+                file.stream.seek(0)
+                if size > MAX_FILE_SIZE:
                     continue
+                filename = secure_filename(file.filename)
                 
-                # Generate EPS if requested
-                if include_eps:
-                    raw_eps = os.path.join(output_eps_dir, base_name + "_raw.eps")
-                    final_eps = os.path.join(output_eps_dir, base_name + ".eps")
-                    
-                    try:
-                        subprocess.run(["potrace", "-e", "-o", raw_eps, pbm_path],
-                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                        convert_to_cmyk_eps(raw_eps, final_eps)
-                        os.remove(raw_eps)
-                    except:
-                        pass
+                # Keep stems unique (logo.png + logo.jpg) so scratch/output names don't collide
+                base_name, ext = os.path.splitext(filename)
+                if base_name in used_stems:
+                    index = 1
+                    while f"{base_name}_{index}" in used_stems:
+                        index += 1
+                    base_name = f"{base_name}_{index}"
+                    filename = base_name + ext
+                used_stems.add(base_name)
                 
-                groups[prefix].append(pbm_path)
-                processed_files.append(filename)
+                input_path = os.path.join(temp_dir, f"in__{filename}")
+                file.save(input_path)
+                prefix = base_name.translate(_DIGIT_DEL).rstrip("_-") or base_name
+                jobs.append((input_path, filename, prefix))
+        
+        # Step 1: Process individual images in parallel, one batch per worker
+        if jobs:
+            # Groups depend only on filenames, so only members of a real group (2+ files)
+            # need their mask sent back from the workers
+            group_sizes = Counter(prefix for _, _, prefix in jobs)
+            grouping = group_by_prefix and include_eps
+            jobs = [(input_path, filename, prefix, grouping and group_sizes[prefix] > 1)
+                    for input_path, filename, prefix in jobs]
+            workers = min(get_pool_size(), len(jobs))
+            size = math.ceil(len(jobs) / workers)
+            batches = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+            n = len(batches)
+            pool = get_process_pool()
+            try:
+                for results in pool.map(_process_batch, batches, [threshold] * n,
+                                        [include_eps] * n, [temp_dir] * n):
+                    for filename, prefix, pbm_path, packed in results:
+                        if packed is not None:
+                            bits, width = packed
+                            groups[prefix].append(
+                                (pbm_path, np.unpackbits(bits, axis=1, count=width).view(bool)))
+                        processed_files.append(filename)
+            except BrokenProcessPool:
+                # A dead worker (e.g. OOM-killed) poisons the whole pool; rebuild it for later requests
+                discard_process_pool(pool)
+                raise
         
         # Step 2: Create grouped EPSs if requested
         if group_by_prefix and include_eps:
@@ -206,65 +462,45 @@ def process_images():
                     continue
                 
                 count = len(pbms)
-                images = [Image.open(p).convert("L") for p in pbms]
+                masks = [mask for _, mask in pbms]
                 cols = math.ceil(math.sqrt(count))
                 rows = math.ceil(count / cols)
-                w, h = images[0].size
-                
-                composite = Image.new("L", (cols * w, rows * h), 255)
-                for idx, img in enumerate(images):
-                    r = idx // cols
-                    c = idx % cols
-                    composite.paste(img, (c * w, r * h))
+                h, w = masks[0].shape
                 
-                composite_fixed = center_scale_to_canvas(composite, FINAL_SIZE)
-                merged_pbm = os.path.join(temp_bw_dir, f"{prefix}_merged.pbm")
-                composite_fixed.save(merged_pbm, format="PPM")
+                # Build composite from the in-memory masks in a single np.block call
+                tiles = [mask_to_tile(mask, (h, w)) for mask in masks]
+                tiles += [np.full((h, w), 255, dtype=np.uint8)] * (rows * cols - count)
+                composite = np.block([tiles[r * cols:(r + 1) * cols] for r in range(rows)])
                 
-                raw_group_eps = os.path.join(output_group_dir, f"{prefix}_final_raw.eps")
-                final_group_eps = os.path.join(output_group_dir, f"{prefix}_final.eps")
-                
-                try:
-                    subprocess.run(["potrace", "-e", "-o", raw_group_eps, merged_pbm],
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                    convert_to_cmyk_eps(raw_group_eps, final_group_eps)
-                    os.remove(raw_group_eps)
-                except:
-                    pass
-        
-        # Create ZIP file with all outputs
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Add SVGs
-            for filename in os.listdir(output_svg_dir):
-                file_path = os.path.join(output_svg_dir, filename)
-                zip_file.write(file_path, os.path.join('svg', filename))
-            
-            # Add individual EPSs
-            if include_eps:
-                for filename in os.listdir(output_eps_dir):
-                    file_path = os.path.join(output_eps_dir, filename)
-                    zip_file.write(file_path, os.path.join('eps', filename))
+                composite_fixed = center_scale_to_canvas(Image.fromarray(composite), FINAL_SIZE)
+                merged_pbm = os.path.join(temp_dir, f"bw__{prefix}_merged.pbm")
+                # Same 50% cut-off potrace applies to greyscale input
+                write_pbm(np.asarray(composite_fixed) < 128, merged_pbm)
                 
-                # Add grouped EPSs
-                for filename in os.listdir(output_group_dir):
-                    file_path = os.path.join(output_group_dir, filename)
-                    zip_file.write(file_path, os.path.join('groups', filename))
+                final_group_eps = os.path.join(temp_dir, f"grp__{prefix}_final.eps")
+                trace_to_cmyk_eps(merged_pbm, final_group_eps)
         
-        zip_buffer.seek(0)
+        # Stream ZIP of all outputs straight to the client
+        def zip_entries():
+            # Route SVGs, individual EPSs and grouped EPSs by filename prefix
+            for entry in os.scandir(temp_dir):
+                kind, sep, name = entry.name.partition('__')
+                if sep and kind in ZIP_FOLDERS:
+                    yield entry.path, os.path.join(ZIP_FOLDERS[kind], name)
         
-        # Clean up temp directory
-        shutil.rmtree(temp_dir)
-        
-        return send_file(
-            zip_buffer,
+        response = Response(
+            stream_with_context(iter_zip(zip_entries())),
             mimetype='application/zip',
-            as_attachment=True,
-            download_name='vectorized_outputs.zip'
+            headers={'Content-Disposition': 'attachment; filename=vectorized_outputs.zip'}
         )
+        
+        # Clean up temp directory once the response has been sent
+        response.call_on_close(cleanup)
+        
+        return response
     
     except Exception as e:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        cleanup()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/', methods=['GET'])